@@ -9,6 +9,7 @@ from typing import Optional
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import uvicorn
@@ -17,14 +18,28 @@ import uvicorn
 from services.ai_service import AIService
 from services.file_service import FileService
 from services.summarization_service import SummarizationService
+from services.profiling_service import ProfilingService, ProfilingMiddleware
+from services.embedding_service import EmbeddingService
 
 # Configuration
 MODEL_PATH = Path("models/phi3-mini.gguf")
+# Sentence embedder for extractive preprocessing of long documents (downloaded if no local copy)
+EMBEDDING_MODEL_PATH = Path("models/all-MiniLM-L6-v2")
+# Prompt-lookup speculative decoding draft size (0 disables)
+DRAFT_TOKENS = 0
+# Per-request profiling ("X-Profile: 1" header or "?profile=1"); off unless enabled here
+PROFILING_ENABLED = False
+PROFILING_INTERVAL_MS = 5.0
+PROFILING_RETENTION = 20
 
 # Global services
-ai_service = AIService(str(MODEL_PATH))
+ai_service = AIService(str(MODEL_PATH), draft_tokens=DRAFT_TOKENS)
 file_service = FileService()
-summarization_service = SummarizationService(ai_service, file_service)
+embedding_service = EmbeddingService(
+    str(EMBEDDING_MODEL_PATH) if EMBEDDING_MODEL_PATH.exists() else "sentence-transformers/all-MiniLM-L6-v2"
+)
+summarization_service = SummarizationService(ai_service, file_service, embedding_service=embedding_service)
+profiling_service = ProfilingService(PROFILING_ENABLED, PROFILING_INTERVAL_MS, PROFILING_RETENTION)
 
 class GenerateRequest(BaseModel):
     prompt: str
@@ -85,8 +100,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Profile-Id"],
 )
 
+# Only installed when enabled, so unprofiled requests pay nothing otherwise
+if profiling_service.enabled:
+    app.add_middleware(ProfilingMiddleware, profiling_service=profiling_service)
+
 @app.get("/")
 async def root():
     """Health check endpoint"""
@@ -104,6 +124,7 @@ async def health_check():
         "model_path": str(MODEL_PATH),
         "model_exists": MODEL_PATH.exists(),
         "model_loaded": ai_service.is_model_loaded(),
+        "draft_tokens": ai_service.draft_tokens,
         "temp_dir": str(file_service.temp_dir)
     }
 
@@ -151,6 +172,26 @@ async def summarize_pdf(request: dict):
     
     return SummarizeResponse(**result)
 
+@app.get("/profiles")
+async def list_profiles():
+    """List retained request profiles, newest first"""
+    if not profiling_service.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    return profiling_service.list_profiles()
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str):
+    """Download a request profile as collapsed stacks (speedscope / flamegraph.pl input)"""
+    if not profiling_service.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    collapsed = profiling_service.get_profile_collapsed(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'}
+    )
+
 @app.post("/chat")
 async def chat_completion(request: GenerateRequest):
     """Chat-style completion (alias for generate for compatibility)"""
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Benchmark prompt-lookup speculative decoding on PDF summarization prompts.
+
+Usage (from backend/):
+    python scripts/benchmark_speculative.py docs/handbook.pdf docs/report.pdf --draft-tokens 10
+
+Each prompt is generated greedily (temperature 0) once without and once with the draft
+model, so the outputs should be identical; tokens/s and any mismatches are reported.
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from services.ai_service import AIService
+from services.pdf_service import PDFService
+from services.prompt_service import PromptService, PromptType
+
+MODEL_PATH = Path("models/phi3-mini.gguf")
+MAX_TOKENS = 300
+
+def run(prompts, draft_tokens):
+    """Generate every prompt with a freshly loaded model; returns (outputs, generated tokens, seconds)."""
+    ai_service = AIService(str(MODEL_PATH), draft_tokens=draft_tokens)
+    ai_service.load_model()
+    outputs, tokens, elapsed = [], 0, 0.0
+    for prompt in prompts:
+        start = time.perf_counter()
+        text = ai_service.generate_text(prompt, max_tokens=MAX_TOKENS, temperature=0.0)
+        elapsed += time.perf_counter() - start
+        outputs.append(text)
+        tokens += len(ai_service.model.tokenize(text.encode("utf-8"), add_bos=False))
+    ai_service.unload_model()
+    return outputs, tokens, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="+", help="PDF files to summarize")
+    parser.add_argument("--draft-tokens", type=int, default=10)
+    parser.add_argument("--summary-length", default="medium", choices=["short", "medium", "long"])
+    args = parser.parse_args()
+
+    prompts = [
+        PromptService.get_prompt(
+            PromptType.PDF_SUMMARIZATION,
+            summary_length=args.summary_length,
+            document_text=PDFService.extract_text_from_file(pdf),
+        )
+        for pdf in args.pdfs
+    ]
+
+    baseline, base_tokens, base_time = run(prompts, 0)
+    speculative, spec_tokens, spec_time = run(prompts, args.draft_tokens)
+
+    print(f"baseline:    {base_tokens} tokens in {base_time:.1f}s ({base_tokens / base_time:.1f} tok/s)")
+    print(f"speculative: {spec_tokens} tokens in {spec_time:.1f}s ({spec_tokens / spec_time:.1f} tok/s), draft={args.draft_tokens}")
+    print(f"speedup:     {base_time / spec_time:.2f}x")
+    mismatches = [pdf for pdf, a, b in zip(args.pdfs, baseline, speculative) if a != b]
+    print(f"identical outputs: {len(prompts) - len(mismatches)}/{len(prompts)}")
+    for pdf in mismatches:
+        print(f"  differs: {pdf}")
+
+if __name__ == "__main__":
+    main()
@@ -2,30 +2,40 @@
 AI Service - Handles AI model inference and text processing
 """
 
-from typing import Optional
+from typing import Optional, Iterator
 from llama_cpp import Llama
+from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
 from pathlib import Path
 
 class AIService:
     """Service for AI model management and inference"""
     
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, draft_tokens: int = 0):
         self.model_path = Path(model_path)
         self.model: Optional[Llama] = None
+        self.n_ctx = 2048
+        # Prompt-lookup speculative decoding: tokens drafted per step (0 disables)
+        self.draft_tokens = draft_tokens
     
     def load_model(self) -> None:
         """Load the AI model"""
         if not self.model_path.exists():
             raise RuntimeError(f"Model file not found: {self.model_path}")
         
+        # Summaries copy long spans from the source, which prompt n-gram drafts predict well
+        draft_model = None
+        if self.draft_tokens > 0:
+            draft_model = LlamaPromptLookupDecoding(num_pred_tokens=self.draft_tokens)
+        
         try:
             self.model = Llama(
                 model_path=str(self.model_path),
-                n_ctx=2048,          # Context window
+                n_ctx=self.n_ctx,    # Context window
                 n_batch=512,         # Batch size for prompt processing  
                 n_threads=None,      # Use all available CPU threads
                 verbose=False,       # Reduce console spam
                 seed=-1,             # Random seed for variety
+                draft_model=draft_model,
             )
         except Exception as e:
             raise RuntimeError(f"Failed to load model: {e}")
@@ -34,6 +44,12 @@ class AIService:
         """Check if model is loaded"""
         return self.model is not None
     
+    def count_tokens(self, text: str) -> int:
+        """Count model tokens in text (without BOS)"""
+        if not self.model:
+            raise RuntimeError("Model not loaded")
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False))
+    
     def generate_text(
         self, 
         prompt: str, 
@@ -64,6 +80,40 @@ class AIService:
         except Exception as e:
             raise RuntimeError(f"Text generation failed: {e}")
     
+    def stream_text(
+        self,
+        prompt: str,
+        max_tokens: int = 300,
+        temperature: float = 0.7,
+        top_p: float = 0.9,
+        stop_sequences: list = None,
+        repeat_penalty: float = 1.1
+    ) -> Iterator[str]:
+        """Generate text token by token; closing the iterator stops generation"""
+        if not self.model:
+            raise RuntimeError("Model not loaded")
+        
+        if stop_sequences is None:
+            stop_sequences = []
+        
+        stream = self.model(
+            prompt,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            top_p=top_p,
+            echo=False,
+            stop=stop_sequences,
+            repeat_penalty=repeat_penalty,
+            stream=True,
+        )
+        try:
+            for chunk in stream:
+                yield chunk['choices'][0]['text']
+        except Exception as e:
+            raise RuntimeError(f"Text generation failed: {e}")
+        finally:
+            stream.close()
+    
     def unload_model(self) -> None:
         """Unload the model to free memory"""
         self.model = None
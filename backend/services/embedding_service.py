@@ -0,0 +1,52 @@
+"""
+Embedding Service - Local sentence embeddings for extractive preprocessing
+"""
+
+import threading
+from typing import List
+
+import numpy as np
+
+class EmbeddingService:
+    """Service for computing normalized sentence embeddings with a local all-MiniLM model"""
+    
+    def __init__(self, model_path: str, batch_size: int = 64):
+        # A local directory is used when present; otherwise the name is resolved by sentence-transformers
+        self.model_path = model_path
+        self.batch_size = batch_size
+        self.model = None
+        self._load_error = None
+        self._lock = threading.Lock()
+    
+    def load_model(self) -> None:
+        """Load the embedding model (done lazily on first use)"""
+        with self._lock:
+            if self.model is not None:
+                return
+            # Don't retry a failed load on every request
+            if self._load_error is not None:
+                raise RuntimeError(self._load_error)
+            try:
+                from sentence_transformers import SentenceTransformer
+                self.model = SentenceTransformer(self.model_path, device="cpu")
+            except Exception as e:
+                self._load_error = f"Failed to load embedding model: {e}"
+                raise RuntimeError(self._load_error)
+    
+    def is_available(self) -> bool:
+        """Check whether embeddings can be computed (model loaded or loadable)"""
+        try:
+            self.load_model()
+            return True
+        except RuntimeError:
+            return False
+    
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts in batches; rows are L2-normalized"""
+        self.load_model()
+        return self.model.encode(
+            texts,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
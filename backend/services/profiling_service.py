@@ -0,0 +1,173 @@
+"""
+Profiling Service - Opt-in sampling profiles of single requests
+A request sent with "X-Profile: 1" or "?profile=1" is sampled while it runs and kept as a
+downloadable collapsed-stack profile (speedscope / flamegraph.pl input)
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+
+class ProfileSession:
+    """Samples the stacks of the threads registered for one request from a background thread"""
+
+    def __init__(self, method: str, path: str, interval_ms: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.interval_ms = interval_ms
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] += 1
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_ms / 1000.0):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> Dict:
+        """Stop sampling and return the profile"""
+        self._stop.set()
+        self._sampler.join()
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "interval_ms": self.interval_ms,
+            "samples": self.samples,
+            "stacks": dict(self.stacks),
+        }
+
+@contextmanager
+def profile_thread():
+    """Include the current thread in the active request profile, if there is one"""
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+    ident = threading.get_ident()
+    session.add_thread(ident)
+    try:
+        yield
+    finally:
+        session.remove_thread(ident)
+
+class ProfilingService:
+    """Service for per-request profiling and the bounded ring of retained profiles"""
+
+    def __init__(self, enabled: bool = False, interval_ms: float = 5.0, retention: int = 20):
+        self.enabled = enabled
+        self.interval_ms = interval_ms
+        self._profiles: deque = deque(maxlen=max(1, retention))
+        self._lock = threading.Lock()
+
+    def wants_profile(self, scope) -> bool:
+        """Check whether a request asked to be profiled"""
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return value.decode("latin-1").lower() in ("1", "true")
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        return query.get("profile", [""])[0].lower() in ("1", "true")
+
+    def start_session(self, method: str, path: str) -> ProfileSession:
+        """Start sampling a request"""
+        session = ProfileSession(method, path, self.interval_ms)
+        session.start()
+        return session
+
+    def finish_session(self, session: ProfileSession) -> None:
+        """Stop sampling a request and keep its profile, dropping the oldest if full"""
+        profile = session.stop()
+        with self._lock:
+            self._profiles.append(profile)
+
+    def list_profiles(self) -> List[Dict]:
+        """Summaries of the retained profiles, newest first, with their hottest leaf functions"""
+        with self._lock:
+            profiles = list(self._profiles)
+        summaries = []
+        for profile in reversed(profiles):
+            leaves = Counter()
+            for stack, count in profile["stacks"].items():
+                leaves[stack.rsplit(';', 1)[-1]] += count
+            summary = {k: v for k, v in profile.items() if k != "stacks"}
+            summary["top_functions"] = [{"function": f, "samples": n} for f, n in leaves.most_common(10)]
+            summaries.append(summary)
+        return summaries
+
+    def get_profile_collapsed(self, profile_id: str) -> Optional[str]:
+        """A retained profile in collapsed-stack format ("frame;frame;frame count" per line)"""
+        with self._lock:
+            profile = next((p for p in self._profiles if p["id"] == profile_id), None)
+        if profile is None:
+            return None
+        return '\n'.join(f"{stack} {count}" for stack, count in profile["stacks"].items()) + '\n'
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests asking for it and adds an X-Profile-Id response header"""
+
+    def __init__(self, app, profiling_service: ProfilingService):
+        self.app = app
+        self.profiling_service = profiling_service
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiling_service.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        session = self.profiling_service.start_session(scope["method"], scope["path"])
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        token = _current_session.set(session)
+        try:
+            # Endpoints run their blocking work on the event loop thread, which is registered here
+            with profile_thread():
+                await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _current_session.reset(token)
+            self.profiling_service.finish_session(session)
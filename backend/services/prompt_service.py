@@ -6,6 +6,9 @@ Provides specialized prompts for different use cases (summarization, chat, etc.)
 from typing import Dict, Any, Optional
 from enum import Enum
 
+# Longest document excerpt placed in a summarization prompt
+MAX_DOCUMENT_CHARS = 4000
+
 class PromptType(Enum):
     """Enum for different prompt types"""
     PDF_SUMMARIZATION = "pdf_summarization"
@@ -71,6 +74,6 @@ Example 3 (Technical Document):
 The system architecture utilizes microservices deployed on AWS with Docker containerization, supporting up to 10,000 concurrent users through load-balanced instances. Key technologies include React frontend, Node.js APIs, PostgreSQL database, and Redis caching, with automated CI/CD pipelines ensuring 99.9% uptime across production environments.
 
 DOCUMENT TO SUMMARIZE:
-{document_text[:4000]}
+{document_text[:MAX_DOCUMENT_CHARS]}
 
 Write a comprehensive summary that captures all essential information in a natural, flowing narrative:"""
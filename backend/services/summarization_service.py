@@ -2,18 +2,64 @@
 Summarization Service - Handles document summarization logic
 """
 
-from typing import Dict, Any
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
 from services.pdf_service import PDFService
 from services.ai_service import AIService
-from services.prompt_service import PromptService, PromptType
+from services.prompt_service import PromptService, PromptType, MAX_DOCUMENT_CHARS
 from services.file_service import FileService
+from services.embedding_service import EmbeddingService
 
 class SummarizationService:
     """Service for document summarization operations"""
     
-    def __init__(self, ai_service: AIService, file_service: FileService):
+    # Lines starting with these are prompt sections leaking into the output
+    ARTIFACT_PREFIXES = ("Example", "EXAMPLE", "PROFESSIONAL", "EDUCATIONAL", "Write a comprehensive")
+    # Lines containing these (case-insensitive) are prompt artifacts
+    ARTIFACT_PHRASES = ("example", "format rules", "document to summarize")
+    # Prompt section headers; once one starts a line the model is reciting the prompt, so generation stops
+    ARTIFACT_HEADER = re.compile(
+        r'^(Example \d|EXAMPLE \d|EXAMPLES:|FORMAT RULES:|DOCUMENT TO SUMMARIZE|TASK:|REQUIREMENTS:|Write a comprehensive)'
+    )
+    # Known hallucination patterns and the error reported for them
+    HALLUCINATION_PATTERNS = [
+        ("42 years", "Detected potential confusion between '42 School' and years of experience"),
+        ("decades of experience", "Detected unrealistic experience duration"),
+        ("veteran engineer", "Detected age-related assumption not in document")
+    ]
+    # Sampling for the first attempt and each retry after a hallucination is detected mid-generation
+    RETRY_SAMPLING = [
+        {"temperature": 0.2, "top_p": 0.9, "repeat_penalty": 1.1},
+        {"temperature": 0.1, "top_p": 0.8, "repeat_penalty": 1.2},
+        {"temperature": 0.0, "top_p": 0.8, "repeat_penalty": 1.3},
+    ]
+    # Extractive pre-selection: weight of centrality vs. novelty in MMR
+    MMR_LAMBDA = 0.7
+    # Tokens kept free in the context window besides the prompt and the summary
+    CONTEXT_MARGIN_TOKENS = 32
+    # Sentences with fewer words are headers, page numbers and other boilerplate
+    MIN_SENTENCE_WORDS = 4
+    # Unpunctuated runs longer than this are split at word boundaries
+    MAX_SENTENCE_CHARS = 400
+    # Very long documents are subsampled evenly to this many candidate sentences
+    MAX_CANDIDATE_SENTENCES = 2000
+    
+    def __init__(
+        self,
+        ai_service: AIService,
+        file_service: FileService,
+        max_generation_attempts: int = 3,
+        embedding_service: Optional[EmbeddingService] = None
+    ):
         self.ai_service = ai_service
         self.file_service = file_service
+        # Without an embedding service long documents are simply truncated
+        self.embedding_service = embedding_service
+        # 1 disables retrying; capped at the number of RETRY_SAMPLING settings
+        self.max_generation_attempts = max_generation_attempts
         self.pdf_service = PDFService()
     
     def summarize_pdf(self, request: Dict[str, Any]) -> Dict[str, Any]:
@@ -41,33 +87,38 @@ class SummarizationService:
             original_length = len(pdf_text)
             summary_length = request.get("summary_length", "medium")
             
+            max_tokens_map = {
+                "short": 150,
+                "medium": 300, 
+                "long": 600
+            }
+            max_tokens = max_tokens_map.get(summary_length, 300)
+            
+            # Keep the most representative sentences of long documents
+            document_text, strategy = self._compress_document(pdf_text, summary_length, max_tokens)
+            
             # Generate prompt
             prompt = PromptService.get_prompt(
                 PromptType.PDF_SUMMARIZATION,
                 summary_length=summary_length,
-                document_text=pdf_text
+                document_text=document_text
             )
             
             # Generate summary
-            max_tokens_map = {
-                "short": 150,
-                "medium": 300, 
-                "long": 600
-            }
-            max_tokens = max_tokens_map.get(summary_length, 300)
             
             stop_sequences = [
                 "\n\nDOCUMENT:", "EXAMPLES:", "FORMAT RULES:", "TASK:", 
                 "Example", "\n\nEXAMPLE", "Write a comprehensive", "\n\nWrite"
             ]
             
-            raw_summary = self.ai_service.generate_text(
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=0.2,
-                top_p=0.9,
-                stop_sequences=stop_sequences
-            )
+            generation = self._generate_monitored(prompt, max_tokens, stop_sequences, summary_length)
+            if generation["error"]:
+                return {
+                    "summary": "",
+                    "success": False,
+                    "error": generation["error"]
+                }
+            raw_summary = generation["text"]
             
             # Post-process summary
             summary = self._post_process_summary(raw_summary, summary_length)
@@ -90,7 +141,7 @@ class SummarizationService:
                 "original_length": original_length,
                 "summary_length": len(summary),
                 "compression_ratio": None,
-                "strategy_used": None,
+                "strategy_used": strategy,
                 "processing_type": None
             }
             
@@ -103,6 +154,145 @@ class SummarizationService:
                 "error": str(e)
             }
     
+    def _compress_document(self, text: str, summary_length: str, max_tokens: int) -> Tuple[str, str]:
+        """
+        Reduce a long document to the sentences that best represent it, within the prompt's token budget.
+        Returns the text to summarize and the strategy used ("full_text", "extractive" or "truncation").
+        """
+        empty_prompt = PromptService.get_prompt(
+            PromptType.PDF_SUMMARIZATION,
+            summary_length=summary_length,
+            document_text=""
+        )
+        budget = (self.ai_service.n_ctx - self.ai_service.count_tokens(empty_prompt)
+                  - max_tokens - self.CONTEXT_MARGIN_TOKENS)
+        if len(text) <= MAX_DOCUMENT_CHARS and self.ai_service.count_tokens(text) <= budget:
+            return text, "full_text"
+        if budget <= 0 or self.embedding_service is None or not self.embedding_service.is_available():
+            return text, "truncation"
+        
+        sentences = self._split_sentences(text)
+        if len(sentences) > self.MAX_CANDIDATE_SENTENCES:
+            step = len(sentences) / self.MAX_CANDIDATE_SENTENCES
+            sentences = [sentences[int(i * step)] for i in range(self.MAX_CANDIDATE_SENTENCES)]
+        if not sentences:
+            return text, "truncation"
+        token_counts = [self.ai_service.count_tokens(sentence) for sentence in sentences]
+        
+        embeddings = self.embedding_service.embed(sentences)
+        selected = self._select_sentences(embeddings, sentences, token_counts, budget)
+        if not selected:
+            return text, "truncation"
+        
+        # Restore document order so the summary follows the original flow
+        return ' '.join(sentences[i] for i in sorted(selected)), "extractive"
+    
+    def _split_sentences(self, text: str) -> List[str]:
+        """Split extracted PDF text into candidate sentences, dropping boilerplate fragments"""
+        sentences = []
+        for sentence in re.split(r'(?<=[.!?])\s+', ' '.join(text.split())):
+            words = sentence.split()
+            if len(words) < self.MIN_SENTENCE_WORDS:
+                continue
+            # Break up text without sentence punctuation (tables, lists) into bounded pieces
+            piece = []
+            for word in words:
+                piece.append(word)
+                if sum(len(w) + 1 for w in piece) >= self.MAX_SENTENCE_CHARS:
+                    sentences.append(' '.join(piece))
+                    piece = []
+            if len(piece) >= self.MIN_SENTENCE_WORDS:
+                sentences.append(' '.join(piece))
+        return sentences
+    
+    def _select_sentences(
+        self,
+        embeddings: np.ndarray,
+        sentences: List[str],
+        token_counts: List[int],
+        budget: int
+    ) -> List[int]:
+        """
+        Greedy maximal marginal relevance: prefer sentences close to the document centroid
+        and unlike those already picked, until the token (and prompt character) budget is full
+        """
+        centroid = embeddings.mean(axis=0)
+        centroid /= max(np.linalg.norm(centroid), 1e-12)
+        centrality = embeddings @ centroid
+        redundancy = np.zeros(len(sentences), dtype=np.float32)
+        available = np.ones(len(sentences), dtype=bool)
+        selected = []
+        used_tokens = 0
+        used_chars = 0
+        
+        while available.any():
+            scores = self.MMR_LAMBDA * centrality - (1 - self.MMR_LAMBDA) * redundancy
+            scores[~available] = -np.inf
+            best = int(np.argmax(scores))
+            available[best] = False
+            
+            # Sentences joined with a space: one extra token and character at most
+            if (used_tokens + token_counts[best] + 1 > budget or
+                    used_chars + len(sentences[best]) + 1 > MAX_DOCUMENT_CHARS):
+                continue
+            selected.append(best)
+            used_tokens += token_counts[best] + 1
+            used_chars += len(sentences[best]) + 1
+            redundancy = np.maximum(redundancy, embeddings @ embeddings[best])
+        
+        return selected
+    
+    def _generate_monitored(self, prompt: str, max_tokens: int, stop_sequences: list, summary_length: str) -> Dict[str, Any]:
+        """
+        Generate a summary, retrying with more conservative sampling when a hallucination is detected
+        or the (possibly truncated) output would not pass validation
+        """
+        error = None
+        attempts = self.RETRY_SAMPLING[:max(1, self.max_generation_attempts)]
+        for attempt, sampling in enumerate(attempts, start=1):
+            text, error = self._stream_until_artifact(prompt, max_tokens, stop_sequences, sampling)
+            if error is None:
+                error = self._validate_summary(self._post_process_summary(text, summary_length))["error"]
+            if error is None:
+                return {"text": text, "error": None, "attempts": attempt}
+        return {"text": "", "error": error, "attempts": len(attempts)}
+    
+    def _stream_until_artifact(self, prompt: str, max_tokens: int, stop_sequences: list, sampling: Dict[str, float]):
+        """
+        Stream one generation, checking every token.
+        Stops at the first prompt section header (keeping the text before it) or hallucination pattern
+        (returning its error) instead of generating the full max_tokens. In-line artifacts are left
+        to _post_process_summary, which drops only the affected line.
+        """
+        longest_pattern = max(len(pattern) for pattern, _ in self.HALLUCINATION_PATTERNS)
+        text = ""
+        stream = self.ai_service.stream_text(
+            prompt=prompt,
+            max_tokens=max_tokens,
+            stop_sequences=stop_sequences,
+            **sampling
+        )
+        try:
+            for piece in stream:
+                text += piece
+                line_start = text.rfind('\n') + 1
+                if self.ARTIFACT_HEADER.match(text[line_start:].strip()):
+                    return text[:line_start], None
+                # Only the new piece plus a pattern's length can contain a new match
+                recent = text[-(len(piece) + longest_pattern):].lower()
+                for pattern, error_msg in self.HALLUCINATION_PATTERNS:
+                    if pattern in recent:
+                        return text, error_msg + ". Please regenerate."
+        finally:
+            stream.close()
+        return text, None
+    
+    def _is_artifact_line(self, line: str) -> bool:
+        """Check whether a line of generated text is prompt content rather than summary"""
+        line = line.strip()
+        return (line.startswith(self.ARTIFACT_PREFIXES) or
+                any(phrase in line.lower() for phrase in self.ARTIFACT_PHRASES))
+    
     def _post_process_summary(self, raw_summary: str, summary_length: str) -> str:
         """Post-process the raw summary to clean up artifacts"""
         summary = raw_summary
@@ -118,15 +308,10 @@ class SummarizationService:
         
         for line in lines:
             line = line.strip()
-            # Skip example content and section headers
-            if (line.startswith("Example") or line.startswith("EXAMPLE") or 
-                line.startswith("PROFESSIONAL") or line.startswith("EDUCATIONAL") or
-                line.startswith("Write a comprehensive") or not line):
+            # Skip example content, section headers and lines with prompt artifacts
+            if not line or self._is_artifact_line(line):
                 continue
-            
-            # Skip lines with prompt artifacts
-            if not any(skip_word in line.lower() for skip_word in ["example", "format rules", "document to summarize"]):
-                cleaned_lines.append(line)
+            cleaned_lines.append(line)
         
         summary = '\n'.join(cleaned_lines).strip()
         
@@ -161,13 +346,7 @@ class SummarizationService:
             }
         
         # Check for hallucination patterns
-        error_patterns = [
-            ("42 years", "Detected potential confusion between '42 School' and years of experience"),
-            ("decades of experience", "Detected unrealistic experience duration"),
-            ("veteran engineer", "Detected age-related assumption not in document")
-        ]
-        
-        for pattern, error_msg in error_patterns:
+        for pattern, error_msg in self.HALLUCINATION_PATTERNS:
             if pattern in summary.lower():
                 return {
                     "valid": False,
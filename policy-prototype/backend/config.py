@@ -5,6 +5,37 @@ class Settings(BaseSettings):
     version: str = "0.1.0"
     debug: bool = True
 
+    # Vector store: "float32", "float16" or "int8" (per-vector scales) for the search matrix
+    vector_storage: str = "float32"
+    # Rescore the quantized shortlist against exact float32 vectors
+    vector_rescore: bool = True
+    # Shortlist size as a multiple of top_k when rescoring
+    vector_shortlist_factor: int = 4
+
+    # Embedding backend: "torch" (sentence-transformers) or "onnx" (ONNX Runtime, local export)
+    embedding_backend: str = "torch"
+    # Model name or local directory for the torch backend
+    embedding_model_path: str = "all-MiniLM-L6-v2"
+    # Directory with the ONNX export and tokenizer.json (defaults to models/all-MiniLM-L6-v2-onnx)
+    embedding_onnx_path: str = ""
+    embedding_onnx_file: str = "model_quantized.onnx"
+    # Intra-op threads for embedding (0 lets the runtime decide)
+    embedding_threads: int = 0
+    embedding_batch_size: int = 32
+
+    # Prompt-lookup speculative decoding: draft tokens proposed per step (0 disables)
+    llm_draft_tokens: int = 0
+
+    # Semantic answer cache: minimum query-embedding cosine similarity for a hit, and entries kept (0 disables)
+    answer_cache_threshold: float = 0.95
+    answer_cache_size: int = 256
+
+    # Per-request profiling via "X-Profile: 1" header or "?profile=1"; off unless enabled here
+    profiling_enabled: bool = False
+    profiling_interval_ms: float = 5.0
+    # Number of profiles kept for download
+    profiling_retention: int = 20
+
     class Config:
         env_file = ".env"
 
@@ -1,6 +1,7 @@
 from fastapi import FastAPI
-from routers import health, policy, search
+from routers import health, policy, search, profiling
 from config import settings
+from services.profiling_service import ProfilingMiddleware
 
 app = FastAPI(title=settings.app_name, version=settings.version, debug=settings.debug)
 
@@ -8,3 +9,8 @@ app = FastAPI(title=settings.app_name, version=settings.version, debug=settings.
 app.include_router(health.router)
 app.include_router(policy.router)
 app.include_router(search.router)
+app.include_router(profiling.router)
+
+# Profiling is opt-in per request, and only possible when enabled in config
+if settings.profiling_enabled:
+    app.add_middleware(ProfilingMiddleware)
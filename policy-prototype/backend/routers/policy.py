@@ -1,3 +1,4 @@
+import os
 from fastapi import APIRouter, UploadFile, File, HTTPException
 from typing import List
 
@@ -21,8 +22,8 @@ async def upload_policy(files: List[UploadFile] = File(...)):
     # For now, use a dummy client_id; in production, get from auth/session
     client_id = "default_client"
     vector_store_paths = []
-    for chunks, emb in zip(chunked_texts, embeddings):
-        path = save_embeddings(client_id, chunks, emb)
+    for saved_path, chunks, emb in zip(saved_paths, chunked_texts, embeddings):
+        path = save_embeddings(client_id, chunks, emb, doc_id=os.path.basename(saved_path))
         vector_store_paths.append(path)
     return {
         "saved_files": saved_paths,
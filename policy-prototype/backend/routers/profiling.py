@@ -0,0 +1,27 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from config import settings
+from services.profiling_service import list_profiles, get_profile_collapsed
+
+router = APIRouter()
+
+@router.get("/profiles", tags=["Profiling"])
+def get_profiles():
+    """List retained request profiles, newest first."""
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    return list_profiles()
+
+@router.get("/profiles/{profile_id}", tags=["Profiling"])
+def download_profile(profile_id: str):
+    """Download a request profile as collapsed stacks (speedscope / flamegraph.pl input)."""
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled.")
+    collapsed = get_profile_collapsed(profile_id)
+    if collapsed is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(
+        collapsed,
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.folded"'},
+    )
@@ -1,39 +1,69 @@
-from fastapi import APIRouter, Query, HTTPException
+from fastapi import APIRouter, Query, HTTPException, Request
 from fastapi.responses import StreamingResponse
-from services.policy.vector_store_service import load_embeddings
-from services.policy.embedding_service import embed_chunks
+from starlette.concurrency import run_in_threadpool
+from typing import AsyncGenerator, Dict
+import json
 
-from typing import List
-import numpy as np
+from services.policy.vector_store_service import load_index, search_embeddings
+from services.policy.embedding_service import embed_chunks
 
 from services.policy.prompt_service import build_rag_prompt
+from services.policy.context_packing_service import pack_context
 from services.policy.llm_service import run_llm
+from services.policy.answer_cache_service import lookup_answer, caching_stream, replay_answer, cache_stats
+from services.profiling_service import profile_thread
 
 router = APIRouter()
 
-def cosine_similarity(a: List[float], b: List[float]) -> float:
-    a = np.array(a)
-    b = np.array(b)
-    if np.linalg.norm(a) == 0 or np.linalg.norm(b) == 0:
-        return 0.0
-    return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
-
-@router.get("/policy/search", tags=["Policy"])
-def search_policy(query: str = Query(..., description="Search query"), top_k: int = 3):
-    """Search for relevant policy chunks using vector similarity and stream LLM output."""
-    client_id = "default_client"
-    records = load_embeddings(client_id)
-    if not records:
+@profile_thread()
+def _prepare_answer(client_id: str, query: str, top_k: int) -> Dict:
+    """Blocking part of a search: embed the query, check the answer cache, retrieve and build the prompt."""
+    index = load_index(client_id)
+    if index is None or not index["records"]:
         raise HTTPException(status_code=404, detail="No policy data found.")
     # Embed the query (returns a list of one embedding)
     query_embedding = embed_chunks([query])[0]
-    # Compute similarity for each chunk
-    for rec in records:
-        rec["similarity"] = cosine_similarity(query_embedding, rec["embedding"])
-    # Sort by similarity, descending
-    results = sorted(records, key=lambda r: r["similarity"], reverse=True)[:top_k]
-    # Build the RAG prompt using the top chunks
-    context_chunks = [r["chunk"] for r in results]
-    rag_prompt = build_rag_prompt(context_chunks, query)
-    llm_stream = run_llm(rag_prompt)
-    return StreamingResponse(llm_stream, media_type="text/plain")
+    prepared = {"index_version": index["version"], "query_embedding": query_embedding, "cached_answer": None, "prompt": None}
+    # Replay a cached answer to a similarly worded question against the same index
+    prepared["cached_answer"] = lookup_answer(client_id, index["version"], top_k, query_embedding)
+    if prepared["cached_answer"] is not None:
+        return prepared
+    # Top chunks by cosine similarity, scored on the (possibly quantized) index
+    results = search_embeddings(client_id, query_embedding, top_k)
+    # Merge overlapping chunks and keep only what fits the model's context window
+    context_chunks = pack_context(results, query)
+    prepared["prompt"] = build_rag_prompt(context_chunks, query)
+    return prepared
+
+async def _event_lines(request: Request, events: AsyncGenerator[Dict, None]) -> AsyncGenerator[str, None]:
+    """Serialize stream events as NDJSON, stopping generation as soon as the client disconnects."""
+    try:
+        async for event in events:
+            if await request.is_disconnected():
+                print("[policy/search] Client disconnected, stopping generation.")
+                break
+            yield json.dumps(event) + "\n"
+    finally:
+        await events.aclose()
+
+@router.get("/policy/search", tags=["Policy"])
+async def search_policy(request: Request, query: str = Query(..., description="Search query"), top_k: int = 3):
+    """
+    Search for relevant policy chunks using vector similarity and stream LLM output.
+    The answer is streamed as NDJSON events: {"type": "token", "text": ...} for each token,
+    then {"type": "done"} or {"type": "error", "message": ...}.
+    """
+    client_id = "default_client"
+    prepared = await run_in_threadpool(_prepare_answer, client_id, query, top_k)
+    if prepared["cached_answer"] is not None:
+        events = replay_answer(prepared["cached_answer"])
+    else:
+        events = caching_stream(
+            run_llm(prepared["prompt"]), client_id, prepared["index_version"], top_k, query, prepared["query_embedding"]
+        )
+    return StreamingResponse(_event_lines(request, events), media_type="application/x-ndjson")
+
+@router.get("/policy/search/cache", tags=["Policy"])
+def search_cache_stats():
+    """Answer cache hit rate and generation time saved."""
+    return cache_stats()
@@ -0,0 +1,109 @@
+from typing import AsyncGenerator, Dict, List, Optional
+from collections import OrderedDict
+import threading
+import time
+
+import numpy as np
+
+from config import settings
+
+# Cached answers per (client_id, top_k): {"version": index version, "entries": OrderedDict of id -> entry}
+_scopes: Dict[tuple, Dict] = {}
+_stats = {"hits": 0, "misses": 0, "saved_generation_seconds": 0.0}
+_next_id = 0
+# Lookups run on the threadpool while stores run on the stream side; guards _scopes, entries and _stats
+_lock = threading.Lock()
+
+def _normalize(embedding: List[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+def _scope(client_id: str, index_version: int, top_k: int) -> Dict:
+    """Entries for a client, dropped as soon as the client's index is re-ingested. Call with _lock held."""
+    scope = _scopes.get((client_id, top_k))
+    if scope is None or scope["version"] != index_version:
+        scope = {"version": index_version, "entries": OrderedDict()}
+        _scopes[(client_id, top_k)] = scope
+    return scope
+
+def lookup_answer(client_id: str, index_version: int, top_k: int, query_embedding: List[float]) -> Optional[str]:
+    """Return a cached answer for a query whose embedding is similar enough to a previous one."""
+    if settings.answer_cache_size <= 0:
+        return None
+    # Snapshot under the lock and compare embeddings outside it
+    with _lock:
+        entries = _scope(client_id, index_version, top_k)["entries"]
+        ids = list(entries)
+        embeddings = [entries[i]["embedding"] for i in ids]
+    best_id, best_similarity = None, settings.answer_cache_threshold
+    if ids:
+        similarities = np.stack(embeddings) @ _normalize(query_embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] >= best_similarity:
+            best_id, best_similarity = ids[best], float(similarities[best])
+    with _lock:
+        # The entry may have been evicted by a concurrent store since the snapshot
+        entry = entries.get(best_id) if best_id is not None else None
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        entries.move_to_end(best_id)
+        _stats["hits"] += 1
+        _stats["saved_generation_seconds"] += entry["generation_seconds"]
+    print(f"[answer-cache] hit (similarity {best_similarity:.3f}) for: {entry['query']}")
+    return entry["answer"]
+
+def store_answer(client_id: str, index_version: int, top_k: int, query: str, query_embedding: List[float], answer: str, generation_seconds: float) -> None:
+    """Cache a completed answer, evicting the least recently used entry when full."""
+    global _next_id
+    if settings.answer_cache_size <= 0 or not answer.strip():
+        return
+    entry = {
+        "query": query,
+        "embedding": _normalize(query_embedding),
+        "answer": answer,
+        "generation_seconds": generation_seconds,
+    }
+    with _lock:
+        entries = _scope(client_id, index_version, top_k)["entries"]
+        entries[_next_id] = entry
+        _next_id += 1
+        while len(entries) > settings.answer_cache_size:
+            entries.popitem(last=False)
+
+async def caching_stream(events: AsyncGenerator[Dict, None], client_id: str, index_version: int, top_k: int, query: str, query_embedding: List[float]) -> AsyncGenerator[Dict, None]:
+    """
+    Pass LLM stream events through unchanged and cache the full answer once it completes.
+    Streams that fail or are closed early (client disconnect) are not cached.
+    """
+    start = time.perf_counter()
+    parts = []
+    try:
+        async for event in events:
+            if event["type"] == "token":
+                parts.append(event["text"])
+            elif event["type"] == "done":
+                store_answer(client_id, index_version, top_k, query, query_embedding, ''.join(parts), time.perf_counter() - start)
+            yield event
+    finally:
+        await events.aclose()
+
+async def replay_answer(answer: str) -> AsyncGenerator[Dict, None]:
+    """Stream a cached answer as the same events a fresh generation produces."""
+    yield {"type": "token", "text": answer}
+    yield {"type": "done"}
+
+def cache_stats() -> Dict:
+    """Hit rate and generation time saved since startup."""
+    with _lock:
+        stats = dict(_stats)
+        entries = sum(len(scope["entries"]) for scope in _scopes.values())
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        "hits": stats["hits"],
+        "misses": stats["misses"],
+        "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+        "saved_generation_seconds": round(stats["saved_generation_seconds"], 3),
+        "entries": entries,
+    }
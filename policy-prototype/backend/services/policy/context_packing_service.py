@@ -0,0 +1,109 @@
+from typing import List, Dict
+import re
+
+from services.policy.prompt_service import build_rag_prompt, CONTEXT_SEPARATOR
+from services.policy.llm_service import count_tokens, truncate_to_tokens, prompt_token_budget
+
+# Shortest shared prefix/suffix treated as chunking overlap rather than coincidence
+MIN_OVERLAP = 20
+# Sentences shorter than this are too generic to deduplicate safely
+MIN_DEDUP_SENTENCE = 20
+# Don't bother truncating a span into a smaller gap than this many tokens
+MIN_PARTIAL_TOKENS = 32
+
+def _merge_text(left: str, right: str) -> str:
+    """Join two consecutive chunks, dropping the overlap chunk_text copied into the second one."""
+    for size in range(min(len(left), len(right)), MIN_OVERLAP - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + ' ' + right
+
+def merge_adjacent_chunks(hits: List[Dict]) -> List[Dict]:
+    """
+    Merge retrieved chunks that are neighbours in the same document into single spans.
+    Returns spans ordered by the best similarity of the chunks they contain.
+    """
+    ordered = sorted(hits, key=lambda r: (str(r.get("doc_id")), r["chunk_index"]))
+    spans = []
+    for hit in ordered:
+        last = spans[-1] if spans else None
+        if last and last["doc_id"] == hit.get("doc_id") and hit["chunk_index"] - last["end_index"] <= 1:
+            if hit["chunk_index"] > last["end_index"]:
+                last["text"] = _merge_text(last["text"], hit["chunk"])
+                last["end_index"] = hit["chunk_index"]
+            last["similarity"] = max(last["similarity"], hit.get("similarity", 0.0))
+            continue
+        spans.append({
+            "doc_id": hit.get("doc_id"),
+            "end_index": hit["chunk_index"],
+            "text": hit["chunk"],
+            "similarity": hit.get("similarity", 0.0),
+        })
+    return sorted(spans, key=lambda s: s["similarity"], reverse=True)
+
+def _normalize_sentence(sentence: str) -> str:
+    return ' '.join(sentence.lower().split())
+
+def _drop_seen_sentences(text: str, seen: set) -> str:
+    """Remove sentences already placed in the context by a higher-ranked span."""
+    kept = []
+    for sentence in re.split(r'(?<=[.!?]) +', text):
+        key = _normalize_sentence(sentence)
+        if len(key) >= MIN_DEDUP_SENTENCE and key in seen:
+            continue
+        kept.append(sentence)
+    return ' '.join(kept).strip()
+
+def _remember_sentences(text: str, seen: set) -> None:
+    for sentence in re.split(r'(?<=[.!?]) +', text):
+        key = _normalize_sentence(sentence)
+        if len(key) >= MIN_DEDUP_SENTENCE:
+            seen.add(key)
+
+def _truncate_at_sentence(text: str, n_tokens: int) -> str:
+    """Truncate to n_tokens, backing off to the last sentence end if that keeps most of the text."""
+    cut = truncate_to_tokens(text, n_tokens)
+    if cut == text:
+        return text
+    end = max(cut.rfind('. '), cut.rfind('! '), cut.rfind('? '))
+    if end >= len(cut) // 2:
+        cut = cut[:end + 1]
+    return cut.strip()
+
+def pack_context(hits: List[Dict], user_query: str) -> List[str]:
+    """
+    Pack retrieved chunks into the token budget left by the RAG prompt and the answer length.
+    Neighbouring chunks are merged, repeated sentences dropped and the last span truncated
+    so the final prompt never exceeds the model's context window.
+    """
+    budget = prompt_token_budget(build_rag_prompt([], user_query))
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    packed = []
+    seen = set()
+    used = 0
+    for span in merge_adjacent_chunks(hits):
+        text = _drop_seen_sentences(span["text"], seen)
+        if not text:
+            continue
+        separator = separator_tokens if packed else 0
+        cost = count_tokens(text) + separator
+        if used + cost > budget:
+            room = budget - used - separator
+            text = _truncate_at_sentence(text, room) if room >= MIN_PARTIAL_TOKENS else ""
+            if text:
+                packed.append(text)
+            break
+        packed.append(text)
+        _remember_sentences(text, seen)
+        used += cost
+    # Token counts of separate pieces are not strictly additive, so check the joined context
+    while packed:
+        excess = count_tokens(CONTEXT_SEPARATOR.join(packed)) - budget
+        if excess <= 0:
+            break
+        last = truncate_to_tokens(packed[-1], count_tokens(packed[-1]) - excess).strip()
+        if last and last != packed[-1]:
+            packed[-1] = last
+        else:
+            packed.pop()
+    return packed
@@ -1,12 +1,112 @@
-
+import os
+import threading
 from typing import List
-from sentence_transformers import SentenceTransformer
 
-# Load the model once at module import
-model = SentenceTransformer("all-MiniLM-L6-v2")
+import numpy as np
+
+from config import settings
+
+# Default location of the exported ONNX model directory (model.onnx / model_quantized.onnx + tokenizer.json)
+ONNX_MODEL_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../models/all-MiniLM-L6-v2-onnx'))
+# all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+class SentenceTransformerBackend:
+    """PyTorch all-MiniLM-L6-v2 through sentence-transformers (normalized mean-pooled embeddings)."""
+
+    def __init__(self, model_path: str, threads: int, batch_size: int):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads > 0:
+            torch.set_num_threads(threads)
+        self.model = SentenceTransformer(model_path)
+        self.batch_size = batch_size
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+
+class OnnxBackend:
+    """
+    all-MiniLM-L6-v2 exported to ONNX (optionally int8-quantized), run with ONNX Runtime on CPU.
+    Texts are tokenized up front and batched by token length, so each batch is only padded
+    to its own longest input.
+    """
+
+    def __init__(self, model_dir: str, model_file: str, threads: int, batch_size: int):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(MAX_SEQ_LENGTH)
+        self.tokenizer.no_padding()
+        self.batch_size = batch_size
+
+    def _encode_batch(self, encodings) -> np.ndarray:
+        length = max(len(e.ids) for e in encodings)
+        input_ids = np.zeros((len(encodings), length), dtype=np.int64)
+        attention_mask = np.zeros((len(encodings), length), dtype=np.int64)
+        for row, encoding in enumerate(encodings):
+            input_ids[row, :len(encoding.ids)] = encoding.ids
+            attention_mask[row, :len(encoding.ids)] = 1
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        hidden = self.session.run(None, feeds)[0]
+        # Mean pooling over real tokens, then L2 normalization, as in the sentence-transformers pipeline
+        mask = attention_mask[:, :, None].astype(np.float32)
+        pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        return pooled / np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+    def encode(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        encodings = self.tokenizer.encode_batch(texts)
+        order = sorted(range(len(texts)), key=lambda i: len(encodings[i].ids))
+        embeddings = None
+        for start in range(0, len(order), self.batch_size):
+            batch = order[start:start + self.batch_size]
+            vectors = self._encode_batch([encodings[i] for i in batch])
+            if embeddings is None:
+                embeddings = np.empty((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+        return embeddings
+
+def create_backend(backend: str):
+    """Build the embedding backend named in settings ("torch" or "onnx")."""
+    if backend == "torch":
+        return SentenceTransformerBackend(settings.embedding_model_path, settings.embedding_threads, settings.embedding_batch_size)
+    if backend == "onnx":
+        return OnnxBackend(
+            settings.embedding_onnx_path or ONNX_MODEL_DIR,
+            settings.embedding_onnx_file,
+            settings.embedding_threads,
+            settings.embedding_batch_size,
+        )
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+# Global backend, loaded on first use
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    global _embedder
+    if _embedder is None:
+        with _embedder_lock:
+            if _embedder is None:
+                print(f"[embedding] Loading {settings.embedding_backend} backend...")
+                _embedder = create_backend(settings.embedding_backend)
+    return _embedder
 
 def embed_chunks(chunks: List[str]) -> List[List[float]]:
     """
-    Convert a list of text chunks into embeddings using a real model.
+    Convert a list of text chunks into embeddings using the configured backend.
     """
-    return model.encode(chunks, convert_to_numpy=True).tolist()
+    return get_embedder().encode(chunks).tolist()
@@ -1,53 +1,140 @@
 import os
 import subprocess
+import asyncio
+import threading
 
 # Prepare for llama-cpp-python integration
 import llama_cpp
+from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+from config import settings
+from services.profiling_service import profile_thread
 
 # Path to the quantized LLM model
 MODEL_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../../models/phi3-mini.gguf'))
 # Path to llama.cpp binary (llama-cli.exe)
 LLAMA_CPP_PATH = os.path.join(os.path.dirname(__file__), '../../../llama.cpp/llama-cli.exe')
 
-from typing import Generator
+from typing import AsyncGenerator, Callable, Dict
+
+# Context window the model is loaded with, and tokens reserved for the answer
+N_CTX = 2048
+MAX_TOKENS = 384
+# Appended to every prompt to encourage the model to end its answer cleanly
+STOP_SEQUENCE = "\n== End ==\n"
 
 # Global model object for persistent in-memory loading
 _llama_model = None
+# Guards the one-time model load, and lets only one generation use the model at a time
+_load_lock = threading.Lock()
+_generation_lock = threading.Lock()
 
 # Model loader function (singleton pattern)
 def get_llama_model():
     global _llama_model
-    if _llama_model is None:
+    if _llama_model is not None:
+        return _llama_model
+    with _load_lock:
+        if _llama_model is not None:
+            return _llama_model
         print("[llama-cpp-python] Loading model into memory...")
+        # Answers quote the policy context heavily, so drafting from prompt n-grams is cheap and often accepted
+        draft_model = None
+        if settings.llm_draft_tokens > 0:
+            draft_model = LlamaPromptLookupDecoding(num_pred_tokens=settings.llm_draft_tokens)
         _llama_model = llama_cpp.Llama(
             model_path=MODEL_PATH,
-            n_ctx=2048,  # You can adjust context size as needed
+            n_ctx=N_CTX,  # You can adjust context size as needed
             n_threads=8, # Adjust for your CPU
+            draft_model=draft_model,
         )
         print("[llama-cpp-python] Model loaded.")
     return _llama_model
 
-def run_llm(prompt: str, n_predict: int = 256) -> Generator[str, None, None]:
+def count_tokens(text: str) -> int:
+    """Count the tokens the loaded model's tokenizer produces for text (without BOS)."""
+    model = get_llama_model()
+    return len(model.tokenize(text.encode("utf-8"), add_bos=False))
+
+def truncate_to_tokens(text: str, n_tokens: int) -> str:
+    """Cut text down to at most n_tokens model tokens."""
+    if n_tokens <= 0:
+        return ""
+    model = get_llama_model()
+    tokens = model.tokenize(text.encode("utf-8"), add_bos=False)
+    if len(tokens) <= n_tokens:
+        return text
+    return model.detokenize(tokens[:n_tokens]).decode("utf-8", errors="ignore")
+
+def prompt_token_budget(prompt: str) -> int:
     """
-    Run the local quantized LLM (phi3-mini.gguf) on the given prompt and stream the answer using llama.cpp.
-    Yields output lines as they are produced.
+    Tokens still free in the context window for a prompt, after reserving the BOS token,
+    the stop sequence run_llm appends and MAX_TOKENS for the answer.
     """
-    print("\n========== LLM PROMPT SENT TO LLAMA.CPP ==========")
-    print(prompt)
-    print("========== END OF PROMPT ==========")
-    # Use a higher n_predict and a stop sequence for more complete answers
-    stop_sequence = "\n== End ==\n"
-    try:
+    used = 1 + count_tokens(prompt + STOP_SEQUENCE) + MAX_TOKENS
+    return max(0, N_CTX - used)
+
+@profile_thread()
+def _generate(prompt: str, cancel: threading.Event, emit: Callable[[str], None]) -> None:
+    """
+    Run one generation in the calling (worker) thread, passing each token to emit.
+    Checks cancel before every token and releases the model as soon as it is set.
+    """
+    with _generation_lock:
+        if cancel.is_set():
+            return
         model = get_llama_model()
         output_stream = model(
-            prompt=prompt + stop_sequence,  # Encourage model to end with stop
-            max_tokens=384,
+            prompt=prompt + STOP_SEQUENCE,  # Encourage model to end with stop
+            max_tokens=MAX_TOKENS,
             temperature=0.7,
             stream=True,
-            stop=[stop_sequence]
+            stop=[STOP_SEQUENCE]
         )
-        for chunk in output_stream:
-            if 'choices' in chunk and len(chunk['choices']) > 0:
-                yield chunk['choices'][0]['text']
-    except Exception as e:
-        yield f"[llama-cpp-python exception: {e}]"
+        try:
+            for chunk in output_stream:
+                if cancel.is_set():
+                    print("[llama-cpp-python] Generation cancelled.")
+                    break
+                if 'choices' in chunk and len(chunk['choices']) > 0:
+                    emit(chunk['choices'][0]['text'])
+        finally:
+            output_stream.close()
+
+async def run_llm(prompt: str) -> AsyncGenerator[Dict, None]:
+    """
+    Run the local quantized LLM (phi3-mini.gguf) on the given prompt and stream the answer as events:
+    {"type": "token", "text": ...} for each token, then {"type": "done"} or {"type": "error", "message": ...}.
+    Generation runs in a worker thread; closing or cancelling this generator (e.g. on client
+    disconnect) stops it before the next token.
+    """
+    print("\n========== LLM PROMPT SENT TO LLAMA.CPP ==========")
+    print(prompt)
+    print("========== END OF PROMPT ==========")
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    cancel = threading.Event()
+
+    def emit(text: str) -> None:
+        loop.call_soon_threadsafe(queue.put_nowait, text)
+
+    def finished(future: asyncio.Future) -> None:
+        # Tokens were queued with call_soon_threadsafe before this runs, so None always comes last
+        if future.exception() is not None and cancel.is_set():
+            print(f"[llama-cpp-python] Cancelled generation failed: {future.exception()}")
+        queue.put_nowait(None)
+
+    worker = asyncio.ensure_future(asyncio.to_thread(_generate, prompt, cancel, emit))
+    worker.add_done_callback(finished)
+    try:
+        while True:
+            text = await queue.get()
+            if text is None:
+                break
+            yield {"type": "token", "text": text}
+        if worker.exception() is not None:
+            yield {"type": "error", "message": f"llama-cpp-python exception: {worker.exception()}"}
+        else:
+            yield {"type": "done"}
+    finally:
+        cancel.set()
@@ -1,23 +1,234 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 import os
+import gc
 import json
+import time
+
+import numpy as np
+
+from config import settings
 
 VECTOR_STORE_DIR = os.path.join(os.path.dirname(__file__), '../../../policy_data/vector_store')
 os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
 
-def save_embeddings(client_id: str, chunks: List[str], embeddings: List[List[float]]):
-    """Save chunks and their embeddings to a JSONL file for the given client."""
-    file_path = os.path.join(VECTOR_STORE_DIR, f'{client_id}_embeddings.jsonl')
-    with open(file_path, 'w', encoding='utf-8') as f:
-        for chunk, embedding in zip(chunks, embeddings):
-            record = {"chunk": chunk, "embedding": embedding}
-            f.write(json.dumps(record) + '\n')
+# float32 keeps full precision; float16 halves it; int8 stores one byte per dimension plus a per-vector scale
+STORAGE_MODES = ("float32", "float16", "int8")
+_MATRIX_SUFFIXES = {"float32": ".f32.npy", "float16": ".f16.npy", "int8": ".i8.npy"}
+_SCALES_SUFFIX = ".scales.npy"
+# Rows dequantized at a time while scoring, to bound temporary memory
+_SCORE_BLOCK_ROWS = 65536
+
+# Loaded indexes per client, invalidated when the store file changes
+_index_cache: Dict[str, Dict] = {}
+
+def _store_path(client_id: str, suffix: str) -> str:
+    return os.path.join(VECTOR_STORE_DIR, f'{client_id}_embeddings{suffix}')
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    """Scale rows to unit length so a dot product is the cosine similarity."""
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+def quantize_matrix(matrix: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Convert a float32 matrix to the given storage mode. Returns the matrix and int8 per-row scales (or None)."""
+    if storage == "float32":
+        return matrix.astype(np.float32), None
+    if storage == "float16":
+        return matrix.astype(np.float16), None
+    if storage == "int8":
+        scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+        scales[scales == 0] = 1.0
+        quantized = np.rint(matrix / scales[:, None]).astype(np.int8)
+        return quantized, scales.astype(np.float32)
+    raise ValueError(f"Unknown vector storage mode: {storage}")
+
+def score_matrix(matrix: np.ndarray, scales: Optional[np.ndarray], query: np.ndarray) -> np.ndarray:
+    """Dot product of every stored vector with a normalized float32 query."""
+    scores = np.empty(len(matrix), dtype=np.float32)
+    for start in range(0, len(matrix), _SCORE_BLOCK_ROWS):
+        block = np.asarray(matrix[start:start + _SCORE_BLOCK_ROWS], dtype=np.float32)
+        scores[start:start + len(block)] = block @ query
+    if scales is not None:
+        scores *= scales
+    return scores
+
+def _write_atomic(path: str, write) -> None:
+    """
+    Write a store file under a temporary name and move it into place.
+    A search still holding the old file memory-mapped keeps reading the old inode instead of
+    faulting on a file truncated under it.
+    """
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    # Windows refuses to replace a file that is still mapped; give in-flight searches a moment to finish
+    for attempt in range(20):
+        try:
+            os.replace(tmp_path, path)
+            return
+        except PermissionError:
+            if attempt == 19:
+                os.remove(tmp_path)
+                raise
+            gc.collect()
+            time.sleep(0.1)
+
+def _remove_file(path: str) -> None:
+    if os.path.exists(path):
+        os.remove(path)
+
+def save_embeddings(client_id: str, chunks: List[str], embeddings: List[List[float]], doc_id: Optional[str] = None, storage: Optional[str] = None):
+    """
+    Save chunks and their embeddings for the given client.
+    Chunk metadata goes to a JSONL file; vectors go to a float32 .npy matrix (used for exact rescoring)
+    plus a quantized copy when a compact storage mode is configured.
+    Each record keeps its source document and position so neighbouring chunks can be merged later.
+    """
+    storage = storage or settings.vector_storage
+    if storage not in STORAGE_MODES:
+        raise ValueError(f"Unknown vector storage mode: {storage}")
+    # Drop the cached index first so its memory map of the old matrix can be released
+    _index_cache.pop(client_id, None)
+    gc.collect()
+    if chunks:
+        matrix = _normalize(np.asarray(embeddings, dtype=np.float32).reshape(len(chunks), -1))
+    else:
+        matrix = np.zeros((0, 0), dtype=np.float32)
+    _write_atomic(_store_path(client_id, _MATRIX_SUFFIXES["float32"]), lambda f: np.save(f, matrix))
+    # Drop quantized copies left over from a previous save or storage mode
+    for mode in ("float16", "int8"):
+        if mode != storage:
+            _remove_file(_store_path(client_id, _MATRIX_SUFFIXES[mode]))
+    if storage == "int8":
+        quantized, scales = quantize_matrix(matrix, storage)
+        _write_atomic(_store_path(client_id, _MATRIX_SUFFIXES[storage]), lambda f: np.save(f, quantized))
+        _write_atomic(_store_path(client_id, _SCALES_SUFFIX), lambda f: np.save(f, scales))
+    else:
+        _remove_file(_store_path(client_id, _SCALES_SUFFIX))
+        if storage == "float16":
+            quantized, _ = quantize_matrix(matrix, storage)
+            _write_atomic(_store_path(client_id, _MATRIX_SUFFIXES[storage]), lambda f: np.save(f, quantized))
+    # Metadata goes last: its mtime is the index version, so readers reload only once the vectors are in place
+    file_path = _store_path(client_id, '.jsonl')
+    lines = ''.join(
+        json.dumps({"chunk": chunk, "doc_id": doc_id, "chunk_index": index}) + '\n'
+        for index, chunk in enumerate(chunks)
+    )
+    _write_atomic(file_path, lambda f: f.write(lines.encode('utf-8')))
+    _index_cache.pop(client_id, None)
     return file_path
 
 def load_embeddings(client_id: str) -> List[Dict]:
-    """Load all chunk-embedding pairs for a client from the vector store."""
-    file_path = os.path.join(VECTOR_STORE_DIR, f'{client_id}_embeddings.jsonl')
+    """
+    Load all chunk records for a client from the vector store.
+    Records only carry an "embedding" list for stores written before vectors moved to .npy files.
+    """
+    file_path = _store_path(client_id, '.jsonl')
     if not os.path.exists(file_path):
         return []
     with open(file_path, 'r', encoding='utf-8') as f:
-        return [json.loads(line) for line in f]
+        records = [json.loads(line) for line in f]
+    # Older stores have no position metadata; file order is chunk order
+    for index, record in enumerate(records):
+        record.setdefault("doc_id", None)
+        record.setdefault("chunk_index", index)
+    return records
+
+def load_index(client_id: str, storage: Optional[str] = None) -> Optional[Dict]:
+    """
+    Load a client's records and vector matrix for searching, cached until the store is rewritten.
+    The float32 matrix is memory-mapped when a compact mode is used, so only rescored rows are read.
+    """
+    storage = storage or settings.vector_storage
+    file_path = _store_path(client_id, '.jsonl')
+    if not os.path.exists(file_path):
+        return None
+    version = os.stat(file_path).st_mtime_ns
+    cached = _index_cache.get(client_id)
+    if cached and cached["version"] == version and cached["storage"] == storage:
+        return cached
+    records = load_embeddings(client_id)
+    exact_path = _store_path(client_id, _MATRIX_SUFFIXES["float32"])
+    if os.path.exists(exact_path):
+        exact = np.load(exact_path, mmap_mode='r' if storage != "float32" else None)
+    else:
+        # Legacy JSONL store with inline embeddings
+        exact = _normalize(np.asarray([r.pop("embedding") for r in records], dtype=np.float32))
+    matrix_path = _store_path(client_id, _MATRIX_SUFFIXES[storage])
+    scales_path = _store_path(client_id, _SCALES_SUFFIX)
+    if storage == "float32":
+        matrix, scales = exact, None
+    elif os.path.exists(matrix_path) and (storage != "int8" or os.path.exists(scales_path)):
+        matrix = np.load(matrix_path)
+        scales = np.load(scales_path) if storage == "int8" else None
+    else:
+        matrix, scales = quantize_matrix(np.asarray(exact), storage)
+    if len(records) != len(exact):
+        # Caught between a save's vector and metadata writes; serve what matches and reload next time
+        size = min(len(records), len(exact))
+        return {
+            "records": records[:size],
+            "matrix": matrix[:size],
+            "scales": scales[:size] if scales is not None else None,
+            "exact": exact[:size],
+            "storage": storage,
+            "version": None,
+        }
+    index = {
+        "records": records,
+        "matrix": matrix,
+        "scales": scales,
+        "exact": exact,
+        "storage": storage,
+        "version": version,
+    }
+    _index_cache[client_id] = index
+    return index
+
+def _top_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    if k >= len(scores):
+        return np.argsort(-scores)
+    top = np.argpartition(-scores, k)[:k]
+    return top[np.argsort(-scores[top])]
+
+def search_embeddings(client_id: str, query_embedding: List[float], top_k: int, rescore: Optional[bool] = None) -> List[Dict]:
+    """
+    Return the top_k chunk records most similar to the query, each with a "similarity" score.
+    Compact storage modes score with the quantized matrix first, then (optionally) rescore a
+    shortlist of top_k * vector_shortlist_factor candidates against the exact float32 vectors.
+    """
+    index = load_index(client_id)
+    if index is None or not index["records"] or top_k <= 0:
+        return []
+    query = _normalize(np.asarray(query_embedding, dtype=np.float32))
+    scores = score_matrix(index["matrix"], index["scales"], query)
+    rescore = settings.vector_rescore if rescore is None else rescore
+    if rescore and index["storage"] != "float32":
+        shortlist = np.sort(_top_indices(scores, top_k * settings.vector_shortlist_factor))
+        exact_scores = np.asarray(index["exact"][shortlist], dtype=np.float32) @ query
+        order = np.argsort(-exact_scores)[:top_k]
+        hits = zip(shortlist[order], exact_scores[order])
+    else:
+        top = _top_indices(scores, top_k)
+        hits = zip(top, scores[top])
+    return [dict(index["records"][i], similarity=float(score)) for i, score in hits]
+
+def index_footprint(client_id: str, storage: Optional[str] = None) -> Dict:
+    """Report the in-memory size of a client's search matrix compared to full float32."""
+    index = load_index(client_id, storage)
+    if index is None:
+        return {}
+    matrix = index["matrix"]
+    scales_bytes = index["scales"].nbytes if index["scales"] is not None else 0
+    float32_bytes = matrix.shape[0] * (matrix.shape[1] if matrix.ndim == 2 else 0) * 4
+    total = matrix.nbytes + scales_bytes
+    return {
+        "storage": index["storage"],
+        "vectors": int(matrix.shape[0]),
+        "dimensions": int(matrix.shape[1]) if matrix.ndim == 2 else 0,
+        "matrix_bytes": int(matrix.nbytes),
+        "scales_bytes": int(scales_bytes),
+        "float32_bytes": int(float32_bytes),
+        "compression": float32_bytes / total if total else 1.0,
+    }
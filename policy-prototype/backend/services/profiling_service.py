@@ -0,0 +1,169 @@
+"""
+Opt-in sampling profiler for single requests.
+
+When profiling is enabled in settings, a request sent with an "X-Profile: 1" header or a
+"profile=1" query parameter is sampled every profiling_interval_ms: the stacks of the threads
+working on it (the event loop thread for the whole request, plus any worker thread that enters
+profile_thread()) are recorded as collapsed stacks, loadable in speedscope or flamegraph.pl.
+Only the last profiling_retention profiles are kept. Unprofiled requests only pay for the
+header/query check; when profiling is disabled the middleware is not installed at all.
+
+Samples of the event loop thread can include other requests' coroutines running concurrently.
+"""
+
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs
+
+from config import settings
+
+_current_session: ContextVar[Optional["ProfileSession"]] = ContextVar("profile_session", default=None)
+_profiles: deque = deque(maxlen=max(1, settings.profiling_retention))
+_profiles_lock = threading.Lock()
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+class ProfileSession:
+    """Samples the stacks of the threads registered for one request from a background thread."""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.interval = settings.profiling_interval_ms / 1000.0
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._threads: Counter = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._run, name=f"profiler-{self.id}", daemon=True)
+
+    def add_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] += 1
+
+    def remove_thread(self, ident: int) -> None:
+        with self._lock:
+            self._threads[ident] -= 1
+            if self._threads[ident] <= 0:
+                del self._threads[ident]
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                threads = list(self._threads)
+            frames = sys._current_frames()
+            for ident in threads:
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if stack:
+                    self.stacks[';'.join(reversed(stack))] += 1
+                    self.samples += 1
+
+    def start(self) -> None:
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._sampler.start()
+
+    def stop(self) -> Dict:
+        """Stop sampling and return the profile artifact."""
+        self._stop.set()
+        self._sampler.join()
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "duration_ms": round((time.perf_counter() - self._start) * 1000, 1),
+            "interval_ms": settings.profiling_interval_ms,
+            "samples": self.samples,
+            "stacks": dict(self.stacks),
+        }
+
+@contextmanager
+def profile_thread():
+    """
+    Include the current thread in the active request profile, if there is one.
+    Use around (or as a decorator on) work a profiled request hands to a worker thread.
+    """
+    session = _current_session.get()
+    if session is None:
+        yield
+        return
+    ident = threading.get_ident()
+    session.add_thread(ident)
+    try:
+        yield
+    finally:
+        session.remove_thread(ident)
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope.get("headers", []):
+        if name == b"x-profile":
+            return value.decode("latin-1").lower() in ("1", "true")
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("profile", [""])[0].lower() in ("1", "true")
+
+class ProfilingMiddleware:
+    """ASGI middleware that profiles requests asking for it and adds an X-Profile-Id response header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+        session = ProfileSession(scope["method"], scope["path"])
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message = dict(message)
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        token = _current_session.set(session)
+        session.start()
+        try:
+            # The app returns only after a streamed body has been fully sent
+            with profile_thread():
+                await self.app(scope, receive, send_with_profile_id)
+        finally:
+            _current_session.reset(token)
+            profile = session.stop()
+            with _profiles_lock:
+                _profiles.append(profile)
+
+def list_profiles() -> List[Dict]:
+    """Summaries of the retained profiles, newest first, with their hottest leaf functions."""
+    with _profiles_lock:
+        profiles = list(_profiles)
+    summaries = []
+    for profile in reversed(profiles):
+        leaves = Counter()
+        for stack, count in profile["stacks"].items():
+            leaves[stack.rsplit(';', 1)[-1]] += count
+        summary = {k: v for k, v in profile.items() if k != "stacks"}
+        summary["top_functions"] = [{"function": f, "samples": n} for f, n in leaves.most_common(10)]
+        summaries.append(summary)
+    return summaries
+
+def get_profile_collapsed(profile_id: str) -> Optional[str]:
+    """A retained profile in collapsed-stack format ("frame;frame;frame count" per line)."""
+    with _profiles_lock:
+        profile = next((p for p in _profiles if p["id"] == profile_id), None)
+    if profile is None:
+        return None
+    return '\n'.join(f"{stack} {count}" for stack, count in profile["stacks"].items()) + '\n'
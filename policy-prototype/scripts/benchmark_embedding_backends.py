@@ -0,0 +1,89 @@
+"""
+Compare the ONNX Runtime embedding backend against the PyTorch (sentence-transformers) path.
+
+Usage (from policy-prototype/):
+    # One-off: int8-quantize an ONNX export (e.g. from `optimum-cli export onnx --model
+    # sentence-transformers/all-MiniLM-L6-v2 models/all-MiniLM-L6-v2-onnx`)
+    python scripts/benchmark_embedding_backends.py --quantize
+
+    python scripts/benchmark_embedding_backends.py --client-id default_client --threads 4
+    python scripts/benchmark_embedding_backends.py --pdf policies/handbook.pdf --tolerance 0.99
+
+Texts are the stored chunks of a client (or chunks of the given PDFs). Both backends embed
+them; the script reports chunks/s for each and the cosine similarity between the two
+embeddings of every chunk, and exits non-zero if any falls below --tolerance.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from config import settings
+from services.policy.embedding_service import ONNX_MODEL_DIR, create_backend
+from services.policy.vector_store_service import load_embeddings
+from services.policy.pdf_service import extract_text_from_pdfs
+from services.policy.chunking_service import chunk_text
+
+def _throughput(backend, texts, runs):
+    backend.encode(texts[:8])  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        embeddings = backend.encode(texts)
+    elapsed = (time.perf_counter() - start) / runs
+    return np.asarray(embeddings, dtype=np.float32), len(texts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client-id", default="default_client")
+    parser.add_argument("--pdf", action="append", default=[], help="Embed chunks of this PDF instead (repeatable)")
+    parser.add_argument("--threads", type=int, default=settings.embedding_threads)
+    parser.add_argument("--batch-size", type=int, default=settings.embedding_batch_size)
+    parser.add_argument("--onnx-file", default=settings.embedding_onnx_file)
+    parser.add_argument("--tolerance", type=float, default=0.99, help="Minimum cosine similarity to the PyTorch embedding")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--quantize", action="store_true", help="Write model_quantized.onnx (int8 weights) from model.onnx and exit")
+    args = parser.parse_args()
+
+    model_dir = settings.embedding_onnx_path or ONNX_MODEL_DIR
+    if args.quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(
+            os.path.join(model_dir, "model.onnx"),
+            os.path.join(model_dir, "model_quantized.onnx"),
+            weight_type=QuantType.QInt8,
+        )
+        print(f"Wrote {os.path.join(model_dir, 'model_quantized.onnx')}")
+        return
+
+    if args.pdf:
+        texts = [chunk for text in extract_text_from_pdfs(args.pdf) for chunk in chunk_text(text)]
+    else:
+        texts = [r["chunk"] for r in load_embeddings(args.client_id)]
+    if not texts:
+        sys.exit("No texts to embed")
+
+    settings.embedding_threads = args.threads
+    settings.embedding_batch_size = args.batch_size
+    settings.embedding_onnx_file = args.onnx_file
+    torch_vectors, torch_rate = _throughput(create_backend("torch"), texts, args.runs)
+    onnx_vectors, onnx_rate = _throughput(create_backend("onnx"), texts, args.runs)
+
+    torch_vectors /= np.maximum(np.linalg.norm(torch_vectors, axis=1, keepdims=True), 1e-12)
+    similarity = (torch_vectors * onnx_vectors).sum(axis=1)
+    print(f"{len(texts)} chunks, threads={args.threads or 'default'}, batch={args.batch_size}, onnx={args.onnx_file}")
+    print(f"torch: {torch_rate:8.1f} chunks/s")
+    print(f"onnx:  {onnx_rate:8.1f} chunks/s ({onnx_rate / torch_rate:.2f}x)")
+    print(f"cosine similarity to torch: min {similarity.min():.4f}, mean {similarity.mean():.4f}")
+    failing = int((similarity < args.tolerance).sum())
+    if failing:
+        print(f"FAIL: {failing} embeddings below tolerance {args.tolerance}")
+        sys.exit(1)
+    print(f"OK: all embeddings within tolerance {args.tolerance}")
+
+if __name__ == "__main__":
+    main()
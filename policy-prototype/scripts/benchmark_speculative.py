@@ -0,0 +1,73 @@
+"""
+Benchmark prompt-lookup speculative decoding on policy RAG prompts.
+
+Usage (from policy-prototype/):
+    python scripts/benchmark_speculative.py "How many vacation days do I get?" "What is the dress code?" --draft-tokens 10
+
+Prompts are built exactly like /policy/search and generated greedily (temperature 0) once
+without and once with the draft model, so the answers should be identical; tokens/s and any
+mismatches are reported.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from config import settings
+from services.policy import llm_service
+from services.policy.embedding_service import embed_chunks
+from services.policy.vector_store_service import search_embeddings
+from services.policy.context_packing_service import pack_context
+from services.policy.prompt_service import build_rag_prompt
+
+def run(prompts, draft_tokens):
+    """Generate every prompt with a freshly loaded model; returns (answers, generated tokens, seconds)."""
+    settings.llm_draft_tokens = draft_tokens
+    llm_service._llama_model = None
+    model = llm_service.get_llama_model()
+    answers, tokens, elapsed = [], 0, 0.0
+    for prompt in prompts:
+        start = time.perf_counter()
+        output = model(
+            prompt=prompt + llm_service.STOP_SEQUENCE,
+            max_tokens=llm_service.MAX_TOKENS,
+            temperature=0.0,
+            stop=[llm_service.STOP_SEQUENCE],
+        )
+        elapsed += time.perf_counter() - start
+        answers.append(output['choices'][0]['text'])
+        tokens += output['usage']['completion_tokens']
+    llm_service._llama_model = None
+    return answers, tokens, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--client-id", default="default_client")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--draft-tokens", type=int, default=10)
+    args = parser.parse_args()
+
+    # Build the prompts once, with the baseline model loaded for token counting
+    settings.llm_draft_tokens = 0
+    prompts = []
+    for query, embedding in zip(args.queries, embed_chunks(args.queries)):
+        results = search_embeddings(args.client_id, embedding, args.top_k)
+        prompts.append(build_rag_prompt(pack_context(results, query), query))
+
+    baseline, base_tokens, base_time = run(prompts, 0)
+    speculative, spec_tokens, spec_time = run(prompts, args.draft_tokens)
+
+    print(f"baseline:    {base_tokens} tokens in {base_time:.1f}s ({base_tokens / base_time:.1f} tok/s)")
+    print(f"speculative: {spec_tokens} tokens in {spec_time:.1f}s ({spec_tokens / spec_time:.1f} tok/s), draft={args.draft_tokens}")
+    print(f"speedup:     {base_time / spec_time:.2f}x")
+    mismatches = [q for q, a, b in zip(args.queries, baseline, speculative) if a != b]
+    print(f"identical outputs: {len(prompts) - len(mismatches)}/{len(prompts)}")
+    for query in mismatches:
+        print(f"  differs: {query}")
+
+if __name__ == "__main__":
+    main()
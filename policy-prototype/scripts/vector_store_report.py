@@ -0,0 +1,83 @@
+"""
+Report memory footprint and recall of the vector store storage modes for one client.
+
+Usage (from policy-prototype/):
+    python scripts/vector_store_report.py default_client --top-k 3 --queries 200
+    python scripts/vector_store_report.py default_client --query "How many vacation days do I get?"
+
+Recall is measured against exact float32 search. Without --query, stored chunk vectors
+are used as queries (their own row is excluded so self-matches don't inflate recall).
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+from config import settings
+from services.policy.vector_store_service import (
+    STORAGE_MODES, load_index, quantize_matrix, score_matrix,
+)
+
+def _top(scores: np.ndarray, k: int) -> set:
+    return set(np.argsort(-scores)[:k].tolist())
+
+def _recall(exact: np.ndarray, queries: np.ndarray, exclude: list, storage: str, top_k: int, shortlist_factor: int):
+    matrix, scales = quantize_matrix(exact, storage)
+    first_pass, rescored = [], []
+    for query, skip in zip(queries, exclude):
+        exact_scores = exact @ query
+        scores = score_matrix(matrix, scales, query)
+        if skip is not None:
+            exact_scores[skip] = -np.inf
+            scores[skip] = -np.inf
+        truth = _top(exact_scores, top_k)
+        first_pass.append(len(truth & _top(scores, top_k)) / len(truth))
+        shortlist = np.argsort(-scores)[:top_k * shortlist_factor]
+        reranked = shortlist[np.argsort(-exact_scores[shortlist])[:top_k]]
+        rescored.append(len(truth & set(reranked.tolist())) / len(truth))
+    return matrix.nbytes + (scales.nbytes if scales is not None else 0), float(np.mean(first_pass)), float(np.mean(rescored))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("client_id")
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--queries", type=int, default=200, help="Stored vectors to sample as queries")
+    parser.add_argument("--query", action="append", default=[], help="Text query to embed (repeatable)")
+    parser.add_argument("--shortlist-factor", type=int, default=settings.vector_shortlist_factor)
+    args = parser.parse_args()
+
+    index = load_index(args.client_id, "float32")
+    if index is None or not index["records"]:
+        sys.exit(f"No vector store found for {args.client_id}")
+    exact = np.asarray(index["exact"], dtype=np.float32)
+    n, dims = exact.shape
+
+    if args.query:
+        from services.policy.embedding_service import embed_chunks
+        queries = np.asarray(embed_chunks(args.query), dtype=np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        exclude = [None] * len(queries)
+    else:
+        rows = np.random.default_rng(0).choice(n, size=min(args.queries, n), replace=False)
+        queries = exact[rows]
+        exclude = rows.tolist()
+
+    # What the vectors cost as JSON text and as Python lists of floats (24-byte float + 8-byte pointer)
+    json_bytes = sum(len(json.dumps(row.tolist())) for row in exact[:100]) / min(n, 100) * n
+    python_list_bytes = n * (56 + dims * 32)
+
+    print(f"{n} vectors x {dims} dims, top_k={args.top_k}, {len(queries)} queries, shortlist x{args.shortlist_factor}")
+    print(f"{'storage':<12}{'MB':>10}{'bytes/vec':>12}{'recall':>10}{'rescored':>10}")
+    print(f"{'json text':<12}{json_bytes / 2**20:>10.2f}{json_bytes / n:>12.0f}")
+    print(f"{'py lists':<12}{python_list_bytes / 2**20:>10.2f}{python_list_bytes / n:>12.0f}")
+    for storage in STORAGE_MODES:
+        size, recall, rescored = _recall(exact, queries, exclude, storage, args.top_k, args.shortlist_factor)
+        print(f"{storage:<12}{size / 2**20:>10.2f}{size / n:>12.0f}{recall:>10.3f}{rescored:>10.3f}")
+
+if __name__ == "__main__":
+    main()